@@ -1,12 +1,96 @@
+import asyncio
+import numpy as np
 import pandas as pd
 import requests
+import sqlite3
 import time
 
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp opsional, tanpa aiohttp pagination berurutan
+    aiohttp = None
+
+try:
+    from orjson import loads as _json_loads
+except ImportError:  # orjson opsional, fallback ke json bawaan
+    from json import loads as _json_loads
+
+_RETRY_STATUS = [429, 500, 502, 503, 504]
+
+# Durasi interval kline Binance dalam ms ("1M" tidak tetap, tidak diparalelkan)
+_INTERVAL_MS = {
+    "1s": 1_000,
+    "1m": 60_000,
+    "3m": 3 * 60_000,
+    "5m": 5 * 60_000,
+    "15m": 15 * 60_000,
+    "30m": 30 * 60_000,
+    "1h": 3_600_000,
+    "2h": 2 * 3_600_000,
+    "4h": 4 * 3_600_000,
+    "6h": 6 * 3_600_000,
+    "8h": 8 * 3_600_000,
+    "12h": 12 * 3_600_000,
+    "1d": 86_400_000,
+    "3d": 3 * 86_400_000,
+    "1w": 7 * 86_400_000,
+}
+
+
+@lru_cache(maxsize=256)
+def _to_timestamp(date_str):
+    """Konversi YYYY-MM-DD (UTC) menjadi timestamp (ms)."""
+    return int(
+        datetime.fromisoformat(date_str).replace(tzinfo=timezone.utc).timestamp() * 1000
+    )
+
+
+class _KlineBuffer:
+    """Kolom kline (open time + OHLCV) yang diisi per halaman tanpa list perantara."""
+
+    def __init__(self, capacity):
+        self._open_time = np.empty(capacity, dtype=np.int64)
+        self._ohlcv = np.empty((capacity, 5))
+        self.size = 0
+
+    def append(self, rows):
+        """Tulis baris API (12 kolom) atau baris cache (6 kolom) ke akhir buffer."""
+        m = len(rows)
+        if not m:
+            return
+
+        # Estimasi kapasitas meleset: perbesar buffer
+        if self.size + m > len(self._open_time):
+            capacity = max(2 * len(self._open_time), self.size + m)
+            self._open_time = np.resize(self._open_time, capacity)
+            self._ohlcv = np.resize(self._ohlcv, (capacity, 5))
+
+        # Isi per kolom langsung ke dtype tujuan, tanpa matrix object + astype
+        end = self.size + m
+        self._open_time[self.size : end] = [row[0] for row in rows]
+        for j in range(5):
+            self._ohlcv[self.size : end, j] = [row[j + 1] for row in rows]
+        self.size = end
+
+    @property
+    def open_time(self):
+        return self._open_time[: self.size]
+
+    @property
+    def ohlcv(self):
+        return self._ohlcv[: self.size]
 
 
 class BinanceDataFetcher:
-    def __init__(self, base_urls=None, timeout=10):
+    def __init__(
+        self, base_urls=None, timeout=10, max_concurrency=4, cache_path=None
+    ):
         # Daftar endpoint alternatif resmi Binance
         self.base_urls = base_urls or [
             "https://data-api.binance.vision",
@@ -17,21 +101,107 @@ class BinanceDataFetcher:
             # "https://api-gcp.binance.com",
         ]
         self.timeout = timeout
+        self.max_concurrency = max_concurrency
 
-    def _to_timestamp(self, date_str):
-        """Konversi YYYY-MM-DD menjadi timestamp (ms)."""
-        return int(datetime.strptime(date_str, "%Y-%m-%d").timestamp() * 1000)
+        # {base_url: (waktu gagal terakhir, jumlah gagal berturut-turut)}
+        self._endpoint_health = {}
 
-    def get_historical_klines(
-        self, symbol, interval="1h", start_date=None, end_date=None, limit=1000
-    ):
-        """Fetch full historical candlestick data (auto-paginated)."""
+        # Satu session untuk semua request: koneksi TLS dipakai ulang antar
+        # halaman, hanya 429/5xx yang di-retry dengan backoff oleh adapter.
+        # Error koneksi / read langsung dilempar agar pindah endpoint.
+        retry = Retry(
+            total=5,
+            connect=0,
+            read=0,
+            backoff_factor=0.5,
+            status_forcelist=_RETRY_STATUS,
+            allowed_methods=["GET"],
+        )
+        self.session = requests.Session()
+        self.session.mount(
+            "https://",
+            HTTPAdapter(pool_connections=8, pool_maxsize=8, max_retries=retry),
+        )
+
+        # Cache kline lokal (opsional), aktif jika cache_path diisi
+        self.cache = None
+        if cache_path:
+            self.cache = sqlite3.connect(cache_path)
+            self.cache.execute(
+                """
+                CREATE TABLE IF NOT EXISTS klines (
+                    symbol TEXT,
+                    interval TEXT,
+                    open_time INTEGER,
+                    open REAL,
+                    high REAL,
+                    low REAL,
+                    close REAL,
+                    volume REAL,
+                    PRIMARY KEY (symbol, interval, open_time)
+                )
+                """
+            )
+            # Range open_time yang sudah diambil lengkap dan semua candle-nya
+            # sudah close, termasuk celah maintenance / sebelum listing
+            self.cache.execute(
+                """
+                CREATE TABLE IF NOT EXISTS fetched_ranges (
+                    symbol TEXT,
+                    interval TEXT,
+                    start_ts INTEGER,
+                    end_ts INTEGER
+                )
+                """
+            )
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        if hasattr(self, "session"):
+            self.close()
+
+    def _live_base_urls(self):
+        """base_urls tanpa endpoint yang masih cooldown setelah gagal."""
+
+        now = time.monotonic()
+        live = []
+        for base_url in self.base_urls:
+            last_fail, fails = self._endpoint_health.get(base_url, (0.0, 0))
+            if not fails or now - last_fail >= min(2**fails, 300):
+                live.append(base_url)
+
+        # Semua endpoint cooldown: tetap coba semua, yang gagal paling lama dulu
+        return live or sorted(
+            self.base_urls, key=lambda url: self._endpoint_health[url][0]
+        )
+
+    def _mark_endpoint(self, base_url, ok):
+        if ok:
+            self._endpoint_health.pop(base_url, None)
+        else:
+            _, fails = self._endpoint_health.get(base_url, (0.0, 0))
+            self._endpoint_health[base_url] = (time.monotonic(), fails + 1)
+
+    def _fetch_sequential(self, symbol, interval, start_ts, end_ts, limit, interval_ms):
+        """Ambil kline halaman demi halaman mengikuti close time terakhir."""
 
         params = {"symbol": symbol, "interval": interval, "limit": limit}
-        all_data = []
 
-        start_ts = self._to_timestamp(start_date) if start_date else None
-        end_ts = self._to_timestamp(end_date) if end_date else None
+        # Pre-size buffer dari panjang range jika diketahui
+        capacity = limit
+        if start_ts and end_ts and interval_ms:
+            capacity += (end_ts - start_ts) // interval_ms
+        klines = _KlineBuffer(capacity)
 
         while True:
             if start_ts:
@@ -39,57 +209,232 @@ class BinanceDataFetcher:
             if end_ts:
                 params["endTime"] = end_ts
 
-            # Pilih salah satu base_url yang berhasil
-            data = None
-            for base_url in self.base_urls:
+            # Pilih salah satu base_url yang berhasil, pindah endpoint hanya
+            # jika koneksi gagal (status error sudah di-retry oleh session)
+            chunk = None
+            for base_url in self._live_base_urls():
                 url = f"{base_url}/api/v3/klines"
                 try:
-                    r = requests.get(url, params=params, timeout=self.timeout)
-                    r.raise_for_status()
-                    chunk = r.json()
-                    if not chunk:
-                        break
-                    all_data.extend(chunk)
+                    r = self.session.get(url, params=params, timeout=self.timeout)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    print(f"⚠️ Failed on {base_url}: {e}")
+                    self._mark_endpoint(base_url, ok=False)
+                    continue
+
+                self._mark_endpoint(base_url, ok=True)
+                r.raise_for_status()
+                chunk = _json_loads(r.content)
+                if chunk:
+                    klines.append(chunk)
                     print(f"Fetched {len(chunk)} of {symbol} candles from {base_url}")
                     # Update start_ts ke close time terakhir + 1 ms
                     last_close = chunk[-1][6]
                     start_ts = last_close + 1
-                    break
-                except Exception as e:
-                    print(f"⚠️ Failed on {base_url}: {e}")
-                    continue
+                break
+
+            if chunk is None:
+                raise ConnectionError("All Binance endpoints are unreachable.")
 
             if not chunk or len(chunk) < limit:
                 break  # selesai, data sudah habis
 
             time.sleep(0.25)  # throttle aman, hindari rate limit
 
-        if not all_data:
+        return klines
+
+    def _fetch_concurrent(self, symbol, interval, windows, limit):
+        """Ambil semua window (startTime, endTime) secara paralel, urut sesuai window."""
+
+        coro = self._fetch_windows(symbol, interval, windows, limit)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coro)
+
+        # Sudah ada event loop yang jalan (mis. Jupyter): pakai thread terpisah
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(asyncio.run, coro).result()
+
+    async def _fetch_windows(self, symbol, interval, windows, limit):
+        # Semaphore membatasi request bersamaan agar tetap di bawah rate limit
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            chunks = await asyncio.gather(
+                *[
+                    self._fetch_window(session, semaphore, symbol, interval, w, limit)
+                    for w in windows
+                ]
+            )
+
+        klines = _KlineBuffer(sum(len(chunk) for chunk in chunks))
+        for chunk in chunks:
+            klines.append(chunk)
+        return klines
+
+    async def _fetch_window(self, session, semaphore, symbol, interval, window, limit):
+        params = {
+            "symbol": symbol,
+            "interval": interval,
+            "limit": limit,
+            "startTime": window[0],
+            "endTime": window[1],
+        }
+
+        async with semaphore:
+            for base_url in self._live_base_urls():
+                url = f"{base_url}/api/v3/klines"
+                try:
+                    for attempt in range(6):
+                        async with session.get(url, params=params) as r:
+                            if r.status in _RETRY_STATUS and attempt < 5:
+                                await asyncio.sleep(0.5 * 2**attempt)
+                                continue
+                            r.raise_for_status()
+                            chunk = _json_loads(await r.read())
+                            break
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    print(f"⚠️ Failed on {base_url}: {e}")
+                    self._mark_endpoint(base_url, ok=False)
+                    continue
+
+                self._mark_endpoint(base_url, ok=True)
+                print(f"Fetched {len(chunk)} of {symbol} candles from {base_url}")
+                return chunk
+
+        raise ConnectionError("All Binance endpoints are unreachable.")
+
+    def _fetch_range(self, symbol, interval, start_ts, end_ts, limit, interval_ms):
+        # Range lengkap diketahui: semua halaman bisa diambil paralel
+        if aiohttp is not None and start_ts and end_ts and interval_ms:
+            step = limit * interval_ms
+            windows = [
+                (t, min(t + step - 1, end_ts))
+                for t in range(start_ts, end_ts + 1, step)
+            ]
+            return self._fetch_concurrent(symbol, interval, windows, limit)
+
+        return self._fetch_sequential(
+            symbol, interval, start_ts, end_ts, limit, interval_ms
+        )
+
+    def _fetch_cached(self, symbol, interval, start_ts, end_ts, limit, interval_ms):
+        """Ambil hanya range yang belum tercatat di cache, lalu baca dari cache."""
+
+        end_ts = end_ts or int(time.time() * 1000)
+
+        for fetch_start, fetch_end in self._missing_ranges(
+            symbol, interval, start_ts, end_ts
+        ):
+            klines = self._fetch_range(
+                symbol, interval, fetch_start, fetch_end, limit, interval_ms
+            )
+
+            # Candle yang belum close tetap disimpan agar bisa dibaca, tapi
+            # range-nya tidak dicatat sehingga diambil ulang di call berikutnya
+            final_end = min(fetch_end, int(time.time() * 1000) - interval_ms)
+            with self.cache:
+                self._cache_store(symbol, interval, klines)
+                if final_end >= fetch_start:
+                    self._record_range(symbol, interval, fetch_start, final_end)
+
+        return self._cache_load(symbol, interval, start_ts, end_ts)
+
+    def _missing_ranges(self, symbol, interval, start_ts, end_ts):
+        """Sub-range [start_ts, end_ts] yang belum tercatat di fetched_ranges."""
+
+        fetched = self.cache.execute(
+            "SELECT start_ts, end_ts FROM fetched_ranges "
+            "WHERE symbol = ? AND interval = ? AND end_ts >= ? AND start_ts <= ? "
+            "ORDER BY start_ts",
+            (symbol, interval, start_ts, end_ts),
+        ).fetchall()
+
+        missing = []
+        cursor = start_ts
+        for fetched_start, fetched_end in fetched:
+            if fetched_start > cursor:
+                missing.append((cursor, fetched_start - 1))
+            cursor = max(cursor, fetched_end + 1)
+
+        if cursor <= end_ts:
+            missing.append((cursor, end_ts))
+        return missing
+
+    def _record_range(self, symbol, interval, start_ts, end_ts):
+        # Gabungkan dengan range yang overlap / bersebelahan
+        overlapping = self.cache.execute(
+            "SELECT start_ts, end_ts FROM fetched_ranges "
+            "WHERE symbol = ? AND interval = ? AND end_ts >= ? AND start_ts <= ?",
+            (symbol, interval, start_ts - 1, end_ts + 1),
+        ).fetchall()
+
+        for fetched_start, fetched_end in overlapping:
+            start_ts = min(start_ts, fetched_start)
+            end_ts = max(end_ts, fetched_end)
+
+        self.cache.executemany(
+            "DELETE FROM fetched_ranges "
+            "WHERE symbol = ? AND interval = ? AND start_ts = ? AND end_ts = ?",
+            [(symbol, interval, *fetched) for fetched in overlapping],
+        )
+        self.cache.execute(
+            "INSERT INTO fetched_ranges VALUES (?, ?, ?, ?)",
+            (symbol, interval, start_ts, end_ts),
+        )
+
+    def _cache_store(self, symbol, interval, klines):
+        self.cache.executemany(
+            "INSERT OR REPLACE INTO klines VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (symbol, interval, open_time, *ohlcv)
+                for open_time, ohlcv in zip(
+                    klines.open_time.tolist(), klines.ohlcv.tolist()
+                )
+            ],
+        )
+
+    def _cache_load(self, symbol, interval, start_ts, end_ts):
+        rows = self.cache.execute(
+            "SELECT open_time, open, high, low, close, volume FROM klines "
+            "WHERE symbol = ? AND interval = ? AND open_time BETWEEN ? AND ? "
+            "ORDER BY open_time",
+            (symbol, interval, start_ts, end_ts),
+        ).fetchall()
+
+        klines = _KlineBuffer(len(rows))
+        klines.append(rows)
+        return klines
+
+    def get_historical_klines(
+        self, symbol, interval="1h", start_date=None, end_date=None, limit=1000
+    ):
+        """Fetch full historical candlestick data (auto-paginated)."""
+
+        start_ts = _to_timestamp(start_date) if start_date else None
+        end_ts = _to_timestamp(end_date) if end_date else None
+        interval_ms = _INTERVAL_MS.get(interval)
+
+        # Cache hanya untuk range dengan awal dan interval yang panjangnya tetap
+        if self.cache is not None and start_ts and interval_ms:
+            klines = self._fetch_cached(
+                symbol, interval, start_ts, end_ts, limit, interval_ms
+            )
+        else:
+            klines = self._fetch_range(
+                symbol, interval, start_ts, end_ts, limit, interval_ms
+            )
+
+        if not klines.size:
             raise ConnectionError("No data retrieved from any Binance endpoint.")
 
         # Format hasil seperti yfinance
         df = pd.DataFrame(
-            all_data,
-            columns=[
-                "Open Time",
-                "Open",
-                "High",
-                "Low",
-                "Close",
-                "Volume",
-                "Close Time",
-                "Quote Asset Volume",
-                "Number of Trades",
-                "Taker Buy Base",
-                "Taker Buy Quote",
-                "Ignore",
-            ],
+            klines.ohlcv,
+            columns=["Open", "High", "Low", "Close", "Volume"],
+            index=pd.to_datetime(klines.open_time, unit="ms", utc=True).rename("Date"),
         )
 
-        df = df[["Open Time", "Open", "High", "Low", "Close", "Volume"]]
-        df["Date"] = pd.to_datetime(df["Open Time"], unit="ms", utc=True)
-        df = df.set_index("Date").drop(columns=["Open Time"])
-        df = df.astype(float)
-
         symbol_name = symbol.replace("USDT", "").upper()
         return {symbol_name: df}
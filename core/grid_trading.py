@@ -1,6 +1,159 @@
+import numpy as np
 import pandas as pd
+from dataclasses import dataclass, fields
 from datetime import datetime
 
+try:
+    from numba import njit
+except ImportError:  # numba opsional, tanpa numba kernel jalan sebagai Python biasa
+
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+# Kolom array trades hasil _simulate
+_BAR, _SIDE, _LEVEL, _PRICE, _QTY, _FEE, _PROFIT = range(7)
+_SIDE_BUY, _SIDE_SELL = 0.0, 1.0
+
+
+@dataclass
+class PortfolioHistory:
+    """
+    Portfolio state per bar as NumPy columns, DataFrame only built on demand.
+    """
+
+    date: pd.Index
+    price: np.ndarray
+    cash: np.ndarray
+    crypto_value: np.ndarray
+    total_value: np.ndarray
+    realized_profit: np.ndarray
+    total_fee: np.ndarray
+    net_profit_after_fee: np.ndarray
+
+    def __len__(self):
+        return len(self.date)
+
+    def to_frame(self):
+        """
+        Returns:
+            pd.DataFrame: One row per bar, same columns as the dataclass fields.
+        """
+        return pd.DataFrame(
+            {field.name: getattr(self, field.name) for field in fields(self)},
+            copy=False,
+        )
+
+
+@njit(cache=True)
+def _simulate(
+    close,
+    event_bars,
+    levels,
+    targets,
+    fee_rate,
+    position_size,
+    cash,
+    total_coin,
+    realized_profit,
+    total_fee,
+    tradable,
+    pos_qty,
+    pos_active,
+    pos_buy_bar,
+    snap_cash,
+    snap_coin,
+    snap_realized,
+    snap_fee,
+):
+    """
+    Run the grid buy/sell state machine sequentially over the event bars.
+    Position state (pos_qty, pos_active, pos_buy_bar) is updated in place and
+    the state after each event bar is written to the snap_* arrays from index 1.
+    Only levels flagged in tradable open positions, so grid levels that round
+    to the same price share one slot.
+    Returns:
+        tuple: (trades, cash, total_coin, realized_profit, total_fee), where
+        trades is an (n_trades, 7) array with columns bar, side, level, price,
+        quantity, fee, profit.
+    """
+    num_levels = len(levels)
+    trades = np.empty((max(16, num_levels * 2), 7))
+    n_trades = 0
+
+    for k in range(len(event_bars)):
+        bar = event_bars[k]
+        current_price = close[bar]
+
+        # Buy dulu, lalu sell, sama seperti execute_buy/sell_order
+        for i in range(num_levels):
+            if (
+                tradable[i]
+                and current_price <= levels[i]
+                and not pos_active[i]
+                and cash >= position_size
+            ):
+                fee = position_size * fee_rate
+                quantity = (position_size / levels[i]) * (1 - fee_rate)
+
+                pos_qty[i] = quantity
+                pos_active[i] = True
+                pos_buy_bar[i] = bar
+
+                cash -= position_size
+                total_coin += quantity
+                total_fee += fee
+
+                if n_trades == len(trades):
+                    grown = np.empty((len(trades) * 2, 7))
+                    grown[:n_trades] = trades
+                    trades = grown
+                trades[n_trades, _BAR] = bar
+                trades[n_trades, _SIDE] = _SIDE_BUY
+                trades[n_trades, _LEVEL] = i
+                trades[n_trades, _PRICE] = levels[i]
+                trades[n_trades, _QTY] = quantity
+                trades[n_trades, _FEE] = fee
+                trades[n_trades, _PROFIT] = 0.0
+                n_trades += 1
+
+        for i in range(num_levels):
+            if pos_active[i] and current_price >= targets[i]:
+                sell_amount = pos_qty[i] * current_price
+                sell_amount_net = sell_amount * (1 - fee_rate)
+                fee = sell_amount - sell_amount_net
+                profit = sell_amount_net - position_size
+
+                cash += sell_amount_net
+                total_coin -= pos_qty[i]
+                realized_profit += profit
+                total_fee += fee
+
+                if n_trades == len(trades):
+                    grown = np.empty((len(trades) * 2, 7))
+                    grown[:n_trades] = trades
+                    trades = grown
+                trades[n_trades, _BAR] = bar
+                trades[n_trades, _SIDE] = _SIDE_SELL
+                trades[n_trades, _LEVEL] = i
+                trades[n_trades, _PRICE] = current_price
+                trades[n_trades, _QTY] = pos_qty[i]
+                trades[n_trades, _FEE] = fee
+                trades[n_trades, _PROFIT] = profit
+                n_trades += 1
+
+                pos_qty[i] = 0.0
+                pos_active[i] = False
+
+        snap_cash[k + 1] = cash
+        snap_coin[k + 1] = total_coin
+        snap_realized[k + 1] = realized_profit
+        snap_fee[k + 1] = total_fee
+
+    return trades[:n_trades], cash, total_coin, realized_profit, total_fee
+
 
 class GridTrading:
     def __init__(
@@ -26,9 +179,21 @@ class GridTrading:
         # Generate grid levels
         self.grid_levels = self._calculate_grid_levels()
 
-        # Initialize trading state
+        # Initialize trading state, posisi disimpan sebagai SoA sejajar
+        # dengan grid_levels (index i = level ke-i)
         self.cash = budget
-        self.positions = {}
+        self.levels_arr = np.asarray(self.grid_levels, dtype=np.float64)
+        self.pos_buy_price = self.levels_arr.copy()
+        self.pos_qty = np.zeros(len(self.grid_levels))
+        self.pos_active = np.zeros(len(self.grid_levels), dtype=np.bool_)
+        self.pos_timestamp = np.empty(len(self.grid_levels), dtype=object)
+
+        # Level duplikat (hasil pembulatan sama) hanya punya satu slot posisi,
+        # yang dipakai index pertama seperti dict keyed by level
+        self.pos_tradable = np.zeros(len(self.grid_levels), dtype=np.bool_)
+        self.pos_tradable[np.unique(self.levels_arr, return_index=True)[1]] = True
+        self.target_prices = None
+        self._target_pct = None
         self.total_coin = 0.0
         self.realized_profit = 0.0
         self.total_fee = 0.0  # 🧾 total biaya fee kumulatif
@@ -57,166 +222,288 @@ class GridTrading:
         if not isinstance(self.num_grids, int) or self.num_grids <= 0:
             raise ValueError("Number of grids must be a positive integer")
 
-        # Calculate grid levels with input validation
-        levels = []
-        total_discount = 0
+        # Calculate grid levels, discount harus di bawah 100%
+        discounts = np.arange(1, self.num_grids + 1) * self.grid_spacing_pct / 100
+        levels = self.initial_price * (1 - discounts[discounts < 1])
 
-        for i in range(1, self.num_grids + 1):
-            # Calculate discount for current level
-            total_discount = i * self.grid_spacing_pct / 100
+        # round() bawaan agar level sama persis dengan backtest sebelumnya
+        return [round(level, 2) for level in levels.tolist()]
 
-            # Ensure discount doesn't exceed 100%
-            if total_discount >= 1:
-                break
-
-            # Calculate price level
-            level = self.initial_price * (1 - total_discount)
-            levels.append(round(level, 2))
+    def _prepare_targets(self, profit_target_pct):
+        """
+        Calculate the sell target of every grid level once per profit target.
+        Returns:
+            np.ndarray: Target prices aligned with levels_arr.
+        """
+        if profit_target_pct != self._target_pct:
+            self.target_prices = self.pos_buy_price * (1 + (profit_target_pct / 100))
+            self._target_pct = profit_target_pct
 
-        return levels
+        return self.target_prices
 
     def _apply_fee(self, amount):
         return amount * (1 - self.fee_rate)
 
     def display_grid_setup(self):
-
-        print("\nGrid Levels:")
-        print("-" * 70)
-        print(
-            f"{'Level':^6} | {'Price':^15} | {'Discount %':^10} | {'USD Amount':^12} | {'Coin Amount':^12}"
-        )
-        print("-" * 70)
+        lines = [
+            "\nGrid Levels:",
+            "-" * 70,
+            f"{'Level':^6} | {'Price':^15} | {'Discount %':^10} | {'USD Amount':^12} | {'Coin Amount':^12}",
+            "-" * 70,
+        ]
 
         for i, level in enumerate(self.grid_levels):
             discount = ((self.initial_price - level) / self.initial_price) * 100
             coin_amount = self.position_size / level
 
-            print(
+            lines.append(
                 f"{i+1:^6} | ${level:>13,.2f} | {discount:>9.2f}% | ${self.position_size:>10,.2f} | {coin_amount:>11.5f}"
             )
 
-        print("-" * 70)
-        print(f"Total Grids: {len(self.grid_levels)}")
-        print(
-            f"Grid Range: {self.grid_spacing_pct * self.num_grids:.1f}% below initial price"
-        )
+        lines += [
+            "-" * 70,
+            f"Total Grids: {len(self.grid_levels)}",
+            f"Grid Range: {self.grid_spacing_pct * self.num_grids:.1f}% below initial price",
+        ]
+        print("\n".join(lines))
 
-    def execute_buy_order(self, current_price, verbose=True):
+    @property
+    def positions(self):
+        """
+        Active positions keyed by grid level.
+        Returns:
+            dict: {level: {"quantity", "buy_price", "timestamp"}} built from the SoA state.
+        """
+        return {
+            self.grid_levels[i]: {
+                "quantity": float(self.pos_qty[i]),
+                "buy_price": float(self.pos_buy_price[i]),
+                "timestamp": self.pos_timestamp[i],
+            }
+            for i in np.flatnonzero(self.pos_active)
+        }
+
+    def execute_buy_order(self, current_price, verbose=True, bar_time=None):
         executed_orders = []
 
-        for level in self.grid_levels:
-            # Check jika price tersentuh sesuai level dan belum punya position
-            if current_price <= level and level not in self.positions:
-                # Check if had enough cash
-                if self.cash >= self.position_size:
-                    fee = self.position_size * self.fee_rate
-                    quantity = self._apply_fee(
-                        self.position_size / level
-                    )  # fee diterapkan ke quantity yang diterima
-
-                    # Execute Buy
-                    self.positions[level] = {
-                        "quantity": quantity,
-                        "buy_price": level,
-                        "timestamp": datetime.now(),
-                    }
-
-                    self.cash -= self.position_size
-                    self.total_coin += quantity
-                    self.total_fee += fee  # 🧾 catat fee
-
-                    executed_orders.append(
-                        {
-                            "type": "BUY",
-                            "price": level,
-                            "quantity": quantity,
-                            "amount": self.position_size,
-                            "fee": fee,
-                        }
-                    )
-
-                    if verbose:
-                        print(f"[BUY] {quantity:.5f} {self.symbol} at ${level:,.2f}")
+        # Waktu fill = waktu bar saat backtest, jam sekarang untuk live
+        if bar_time is None:
+            bar_time = datetime.now()
+
+        # Check jika price tersentuh sesuai level dan belum punya position
+        triggers = np.flatnonzero(
+            self.pos_tradable & (current_price <= self.levels_arr) & ~self.pos_active
+        )
+
+        for i in triggers:
+            # Check if had enough cash
+            if self.cash < self.position_size:
+                break
+
+            level = self.grid_levels[i]
+            fee = self.position_size * self.fee_rate
+            quantity = self._apply_fee(
+                self.position_size / level
+            )  # fee diterapkan ke quantity yang diterima
+
+            # Execute Buy
+            self.pos_qty[i] = quantity
+            self.pos_active[i] = True
+            self.pos_timestamp[i] = bar_time
+
+            self.cash -= self.position_size
+            self.total_coin += quantity
+            self.total_fee += fee  # 🧾 catat fee
+
+            executed_orders.append(
+                {
+                    "type": "BUY",
+                    "price": level,
+                    "quantity": quantity,
+                    "amount": self.position_size,
+                    "fee": fee,
+                }
+            )
+
+            if verbose:
+                print(f"[BUY] {quantity:.5f} {self.symbol} at ${level:,.2f}")
 
         return executed_orders
 
     def execute_sell_order(self, current_price, profit_target_pct=3.4, verbose=True):
         executed_orders = []
 
-        # Check semua active positions
-        for level, position in list(self.positions.items()):
-            target_price = position["buy_price"] * (1 + (profit_target_pct / 100))
+        # Sell semua active positions yang current_price >= target price
+        target_prices = self._prepare_targets(profit_target_pct)
+        sell_idx = np.flatnonzero(self.pos_active & (current_price >= target_prices))
+
+        for i in sell_idx:
+            quantity = float(self.pos_qty[i])
+            buy_price = float(self.pos_buy_price[i])
+            sell_amount = quantity * current_price
+            sell_amount_net = self._apply_fee(
+                sell_amount
+            )  # fee diterapkan ke hasil jual
+            fee = sell_amount - sell_amount_net
+            profit = sell_amount_net - self.position_size
+
+            # Execute Sell
+            self.cash += sell_amount_net  # 💡 cash sudah dikurangi fee
+            self.total_coin -= quantity
+            self.realized_profit += profit
+            self.total_fee += fee  # 🧾 catat fee
+
+            executed_orders.append(
+                {
+                    "type": "SELL",
+                    "buy_price": buy_price,
+                    "sell_price": current_price,
+                    "quantity": quantity,
+                    "profit": profit,
+                    "fee": fee,
+                }
+            )
 
-            # Sell jika current_price >= target price
-            if current_price >= target_price:
-                sell_amount = position["quantity"] * current_price
-                sell_amount_net = self._apply_fee(
-                    sell_amount
-                )  # fee diterapkan ke hasil jual
-                fee = sell_amount - sell_amount_net
-                profit = sell_amount_net - self.position_size
-
-                # Execute Sell
-                self.cash += sell_amount_net  # 💡 cash sudah dikurangi fee
-                self.total_coin -= position["quantity"]
-                self.realized_profit += profit
-                self.total_fee += fee  # 🧾 catat fee
-
-                executed_orders.append(
-                    {
-                        "type": "SELL",
-                        "buy_price": position["buy_price"],
-                        "sell_price": current_price,
-                        "quantity": position["quantity"],
-                        "profit": profit,
-                        "fee": fee,
-                    }
+            if verbose:
+                print(
+                    f"[SELL] {quantity:.5f} {self.symbol} at ${current_price:,.2f} | Profit: ${profit:,.2f}"
                 )
 
-                if verbose:
-                    print(
-                        f"[SELL] {position['quantity']:.5f} {self.symbol} at ${current_price:,.2f} | Profit: ${profit:,.2f}"
-                    )
-
-                del self.positions[level]
+        self.pos_qty[sell_idx] = 0.0
+        self.pos_active[sell_idx] = False
+        self.pos_timestamp[sell_idx] = None
 
         return executed_orders
 
-    def simulate_grid_trading(self, price_data, profit_target_pct):
+    def simulate_grid_trading(
+        self, price_data, profit_target_pct, verbose=False, log_callback=None
+    ):
         print(
             f"Simulating Grid Trading for {self.symbol} with TP : {profit_target_pct}%"
         )
-        trading_log, portofolio_history = [], []
-
-        for date, row in price_data.iterrows():
-            current_price = float(row["Close"])
-            # print(f'Ini harga sekarang : {current_price:,.2f}')
-
-            # Execute trading logic
-            buy_orders = self.execute_buy_order(current_price)
-            sell_orders = self.execute_sell_order(current_price, profit_target_pct)
+        close = price_data["Close"].to_numpy(dtype=np.float64)
+        levels = self.levels_arr
+        targets = self._prepare_targets(profit_target_pct)
+
+        # Bar yang bisa memicu order: harga di bawah level buy tertinggi atau
+        # di atas target sell terendah. Bar lain tidak mengubah state.
+        if len(levels):
+            event_bars = np.flatnonzero(
+                (close <= levels.max()) | (close >= targets.min())
+            )
+        else:
+            event_bars = np.empty(0, dtype=np.int64)
+
+        # Bar pembelian posisi baru, -1 = posisi lama / tidak ada
+        pos_buy_bar = np.full(len(levels), -1, dtype=np.int64)
+
+        # Snapshot state setelah tiap event bar, index 0 = state awal
+        n_events = len(event_bars)
+        cash = np.empty(n_events + 1)
+        coin = np.empty(n_events + 1)
+        realized = np.empty(n_events + 1)
+        fees = np.empty(n_events + 1)
+        cash[0], coin[0] = self.cash, self.total_coin
+        realized[0], fees[0] = self.realized_profit, self.total_fee
+
+        (
+            trades,
+            self.cash,
+            self.total_coin,
+            self.realized_profit,
+            self.total_fee,
+        ) = _simulate(
+            close,
+            event_bars,
+            levels,
+            targets,
+            float(self.fee_rate),
+            float(self.position_size),
+            float(self.cash),
+            float(self.total_coin),
+            float(self.realized_profit),
+            float(self.total_fee),
+            self.pos_tradable,
+            self.pos_qty,
+            self.pos_active,
+            pos_buy_bar,
+            cash,
+            coin,
+            realized,
+            fees,
+        )
 
-            # Log all trades
-            for order in buy_orders + sell_orders:
-                order["date"] = date
-                trading_log.append(order)
+        self.pos_timestamp[~self.pos_active] = None
+        bought = self.pos_active & (pos_buy_bar >= 0)
+        self.pos_timestamp[bought] = price_data.index[pos_buy_bar[bought]]
 
-            # Record portfolio state
-            crypto_value = self.total_coin * current_price
-            total_value = self.cash + crypto_value
+        # Log per order hanya jika diminta, tidak ada I/O di jalur default
+        if verbose or log_callback is not None:
+            for side, price, quantity, profit in trades[
+                :, [_SIDE, _PRICE, _QTY, _PROFIT]
+            ]:
+                if side == _SIDE_BUY:
+                    message = f"[BUY] {quantity:.5f} {self.symbol} at ${price:,.2f}"
+                else:
+                    message = f"[SELL] {quantity:.5f} {self.symbol} at ${price:,.2f} | Profit: ${profit:,.2f}"
 
-            portofolio_history.append(
-                {
-                    "date": date,
-                    "price": current_price,
-                    "cash": self.cash,
-                    "crypto_value": crypto_value,
-                    "total_value": total_value,
-                    "realized_profit": self.realized_profit,
-                    "total_fee": self.total_fee,
-                    "net_profit_after_fee": self.realized_profit - self.total_fee,
-                }
-            )
+                if verbose:
+                    print(message)
+                if log_callback is not None:
+                    log_callback(message)
+
+        trading_log = self._build_trading_log(trades, levels, price_data.index)
+
+        # Forward-fill state ke semua bar, langsung ke array kolom per bar
+        n = len(close)
+        state = np.searchsorted(event_bars, np.arange(n), side="right")
+        cash_arr, crypto_arr, total_arr = np.empty(n), np.empty(n), np.empty(n)
+        profit_arr, fee_arr, net_arr = np.empty(n), np.empty(n), np.empty(n)
+
+        np.take(cash, state, out=cash_arr)
+        np.take(coin, state, out=crypto_arr)
+        np.multiply(crypto_arr, close, out=crypto_arr)
+        np.add(cash_arr, crypto_arr, out=total_arr)
+        np.take(realized, state, out=profit_arr)
+        np.take(fees, state, out=fee_arr)
+        np.subtract(profit_arr, fee_arr, out=net_arr)
+
+        portofolio_history = PortfolioHistory(
+            date=price_data.index,
+            price=close.copy(),  # close bisa berupa view ke price_data
+            cash=cash_arr,
+            crypto_value=crypto_arr,
+            total_value=total_arr,
+            realized_profit=profit_arr,
+            total_fee=fee_arr,
+            net_profit_after_fee=net_arr,
+        )
 
         print(f"\n✅ Total Fee Dikeluarkan: ${self.total_fee:,.2f}")
-        return pd.DataFrame(trading_log), pd.DataFrame(portofolio_history)
+        return trading_log, portofolio_history
+
+    def _build_trading_log(self, trades, levels, index):
+        """
+        Build the trading log DataFrame in one go from the _simulate trades array.
+        Returns:
+            pd.DataFrame: One row per order, same columns as the order dicts
+            from execute_buy_order/execute_sell_order plus date.
+        """
+        is_buy = trades[:, _SIDE] == _SIDE_BUY
+        price = trades[:, _PRICE]
+        quantity = trades[:, _QTY]
+        buy_price = levels[trades[:, _LEVEL].astype(np.int64)]
+
+        return pd.DataFrame(
+            {
+                "type": np.where(is_buy, "BUY", "SELL"),
+                "price": np.where(is_buy, price, np.nan),
+                "quantity": quantity,
+                "amount": np.where(is_buy, float(self.position_size), np.nan),
+                "fee": trades[:, _FEE],
+                "date": index[trades[:, _BAR].astype(np.int64)],
+                "buy_price": np.where(is_buy, np.nan, buy_price),
+                "sell_price": np.where(is_buy, np.nan, price),
+                "profit": np.where(is_buy, np.nan, trades[:, _PROFIT]),
+            }
+        )
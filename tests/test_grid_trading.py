@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+from core.grid_trading import GridTrading
+
+
+def _price_data(prices):
+    return pd.DataFrame(
+        {"Close": prices},
+        index=pd.date_range("2024-01-01", periods=len(prices), freq="D"),
+    )
+
+
+def _doge_grid():
+    # Levels: [0.2, 0.2, 0.19 x5, 0.18 x3] setelah dibulatkan 2 desimal
+    return GridTrading("DOGE", 0.2, 1, entry_alloc=0.05, num_grids=10)
+
+
+def test_simulate_duplicate_levels_share_one_position():
+    # Nilai acuan dari implementasi lama dengan self.positions keyed by level
+    grid = _doge_grid()
+    trading_log, _ = grid.simulate_grid_trading(
+        _price_data([0.20, 0.195, 0.19, 0.185, 0.19, 0.21]), 3.4
+    )
+
+    assert len(trading_log) == 4
+    assert grid.cash == pytest.approx(1007.547739, abs=1e-6)
+    assert len(grid.positions) == 0
+
+
+def test_simulate_duplicate_levels_open_positions():
+    grid = _doge_grid()
+    trading_log, _ = grid.simulate_grid_trading(
+        _price_data([0.20, 0.195, 0.19, 0.185]), 3.4
+    )
+
+    assert len(trading_log) == 2
+    assert grid.cash == pytest.approx(900.0)
+    assert grid.total_coin == pytest.approx(512.644737, abs=1e-6)
+    assert len(grid.positions) == 2
+
+
+def test_execute_orders_duplicate_levels_share_one_position():
+    grid = _doge_grid()
+    executed = 0
+    for price in [0.20, 0.195, 0.19, 0.185]:
+        executed += len(grid.execute_buy_order(price, verbose=False))
+        executed += len(grid.execute_sell_order(price, 3.4, verbose=False))
+
+    assert executed == 2
+    assert grid.cash == pytest.approx(900.0)
+    assert grid.total_coin == pytest.approx(512.644737, abs=1e-6)
+    assert sum(p["quantity"] for p in grid.positions.values()) == pytest.approx(
+        grid.total_coin
+    )
+    assert int(grid.pos_active.sum()) == len(grid.positions) == 2
@@ -1,14 +1,14 @@
+import numpy as np
+
+
 def generate_colors(n):
-    colors = []
-    for i in range(n):
-        ratio = i / max(n - 1, 1)
+    t = np.linspace(0, 1, n) * 6
 
-        r = max(0, min(1, abs(ratio * 6 - 3) - max(abs(ratio * 6 - 4) - 1, 0)))
-        g = max(0, min(1, 1 - abs(ratio * 6 - 2)))
-        b = max(0, min(1, 1 - abs(ratio * 6 - 4)))
+    r = np.clip(np.abs(t - 3) - np.maximum(np.abs(t - 4) - 1, 0), 0, 1)
+    g = np.clip(1 - np.abs(t - 2), 0, 1)
+    b = np.clip(1 - np.abs(t - 4), 0, 1)
 
-        colors.append((r, g, b))
-    return colors
+    return list(zip(r.tolist(), g.tolist(), b.tolist()))
 
 
 def print_dict_pretty(d, indent=0):